@@ -1,22 +1,46 @@
-from flask import Flask, request
+from flask import Flask, Response, request, stream_with_context
 from datetime import datetime
 import sys
+import atexit
 import os
 import json
+try:
+    import orjson
+except ImportError:  # optional speedup, stdlib json is the fallback
+    orjson = None
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from requests.structures import CaseInsensitiveDict
 import time
 import random
+import itertools
+import shutil
+import subprocess
+import tempfile
+from collections import deque
 from utils import resource_path
 import logging
+import logging.handlers
 import threading
+import queue
+import socket
 from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+from email.utils import parsedate_to_datetime
+from types import MappingProxyType
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
 
 """
 Key behavior changes:
 - Respond immediately to POST requests before processing downloads
-- Process downloads in background thread
+- Process downloads on one persistent background worker fed by a queue
 - Prevent concurrent download operations
 - Return busy status if download is in progress
+- Download each batch on a small thread pool, paced per host by a rate limiter
 """
 
 # ---------------------------
@@ -24,15 +48,51 @@ Key behavior changes:
 # ---------------------------
 
 class DownloadManager:
+    """Download state shared with the Flask handlers.
+
+    Counters are only written by the download thread, so /status reads them
+    without taking the lock; the lock guards the rare start/finish transitions."""
+
     def __init__(self):
-        self.is_downloading = False
+        self._running = threading.Event()
         self.pending_count = 0
         self.completed_count = 0
         self.total_count = 0
         self.batch_number = 0
         self.lock = Lock()
-        self.download_thread = None
+        self.worker_thread = None
+        self.jobs = queue.Queue()
+        self.scheduled = False
         self.start_time = None
+        self.subscribers = []
+
+    @property
+    def is_downloading(self):
+        return self._running.is_set()
+
+    def subscribe(self, limit):
+        """Register a /progress listener; each status change is pushed onto its queue.
+
+        Returns None when `limit` listeners are already registered."""
+        q = queue.Queue(maxsize=100)
+        with self.lock:
+            if len(self.subscribers) >= limit:
+                return None
+            self.subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            if q in self.subscribers:
+                self.subscribers.remove(q)
+
+    def publish(self):
+        status = self.get_status()
+        for q in list(self.subscribers):
+            try:
+                q.put_nowait(status)
+            except queue.Full:
+                pass  # slow client; it will catch up on the next event
 
     def start_batch(self, pending_count):
         with self.lock:
@@ -40,43 +100,73 @@ class DownloadManager:
             self.pending_count = pending_count
             self.total_count = pending_count
             self.completed_count = 0
+        self.publish()
 
     def start_download(self):
         with self.lock:
-            if self.is_downloading:
+            if self._running.is_set():
                 return False
-            self.is_downloading = True
             self.batch_number = 0
             self.start_time = datetime.now()
+            self._running.set()
+        self.publish()
+        return True
+
+    def launch(self, target):
+        """Queue `target` for the persistent worker unless a run is already scheduled or active."""
+        with self.lock:
+            if self.scheduled or self._running.is_set():
+                return False
+            if self.worker_thread is None or not self.worker_thread.is_alive():
+                self.worker_thread = threading.Thread(target=self._worker, daemon=True)
+                self.worker_thread.start()
+            self.scheduled = True
+            self.jobs.put_nowait(target)
             return True
 
+    def _worker(self):
+        """One long-lived thread runs every download job, instead of a new thread per POST."""
+        while True:
+            target = self.jobs.get()
+            try:
+                target()
+            except Exception as e:
+                logging.error(f"WORKER_ERROR: {e}")
+            finally:
+                with self.lock:
+                    self.scheduled = False
+
     def update_progress(self):
-        with self.lock:
-            self.completed_count += 1
-            self.pending_count -= 1
+        # Single writer (the download thread); plain int updates are enough
+        self.completed_count += 1
+        self.pending_count -= 1
+        self.publish()
 
     def finish_download(self):
+        # `scheduled` is cleared by _worker once the job has returned, not here:
+        # a launch() between the two would otherwise be forgotten
         with self.lock:
-            self.is_downloading = False
+            self._running.clear()
             self.pending_count = 0
-            self.download_thread = None
             self.start_time = None
+        self.publish()
 
     def get_status(self):
-        with self.lock:
-            if not self.is_downloading:
-                return {"status": "idle", "message": "No downloads in progress"}
+        # Lock-free snapshot; read start_time once since finish_download may clear it
+        start_time = self.start_time
+        if not self._running.is_set():
+            return {"status": "idle", "message": "No downloads in progress"}
 
-            elapsed = (datetime.now() - self.start_time).seconds if self.start_time else 0
-            return {
-                "status": "downloading",
-                "message": f"Busy downloading videos (batch {self.batch_number})",
-                "batch": self.batch_number,
-                "total": self.total_count,
-                "completed": self.completed_count,
-                "pending": self.pending_count,
-                "elapsed_seconds": elapsed
-            }
+        elapsed = (datetime.now() - start_time).seconds if start_time else 0
+        return {
+            "status": "downloading",
+            "message": f"Busy downloading videos (batch {self.batch_number})",
+            "batch": self.batch_number,
+            "total": self.total_count,
+            "completed": self.completed_count,
+            "pending": self.pending_count,
+            "elapsed_seconds": elapsed
+        }
 
 download_manager = DownloadManager()
 
@@ -109,13 +199,28 @@ def setup_logging():
     logs_path = create_directory("logs")
 
     # --- File handler: plain text, machine-readable ---
-    file_handler = logging.FileHandler(
+    # Appends (keeps history across restarts), rotates at 10 MB, and is fed
+    # through a MemoryHandler so records hit the disk in batches of 512
+    rotating_handler = logging.handlers.RotatingFileHandler(
         os.path.join(logs_path, f"log-{datetime.now().strftime('%Y-%m-%d')}.log"),
-        mode="w",
+        maxBytes=10 * 1024 * 1024,
+        backupCount=5,
         encoding="utf-8",
+        delay=True,
     )
     file_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    file_handler.setFormatter(file_formatter)
+    rotating_handler.setFormatter(file_formatter)
+    # Download failures are logged at INFO, so flushLevel alone rarely fires;
+    # records logged with extra={"flush": True} (batch and run summaries) flush too
+    class SummaryFlushingMemoryHandler(logging.handlers.MemoryHandler):
+        def shouldFlush(self, record):
+            return super().shouldFlush(record) or getattr(record, "flush", False)
+
+    file_handler = SummaryFlushingMemoryHandler(
+        capacity=512,
+        flushLevel=logging.ERROR,
+        target=rotating_handler,
+    )
 
     # --- Console handler: colored, human-friendly ---
     class ColoredConsoleHandler(logging.StreamHandler):
@@ -157,12 +262,15 @@ def setup_logging():
                 # Level indicator
                 lvl = record.levelno
                 if lvl >= logging.ERROR:
-                    badge = f"{C.BG_RED}{C.WHITE} ERR {C.RESET}"
+                    badge, badge_width = f"{C.BG_RED}{C.WHITE} ERR {C.RESET}", 5
                 elif lvl >= logging.WARNING:
-                    badge = f"{C.BG_RED}{C.WHITE} WRN {C.RESET}"
+                    badge, badge_width = f"{C.BG_RED}{C.WHITE} WRN {C.RESET}", 5
                 else:
-                    badge = f"{C.DIM}{ts}{C.RESET}"
+                    badge, badge_width = f"{C.DIM}{ts}{C.RESET}", len(ts)
 
+                # Multi-line records (log_box) keep their lines aligned under the first
+                if "\n" in msg:
+                    msg = msg.replace("\n", "\n" + " " * (badge_width + 2))
                 line = f" {badge} {color}{msg}{C.RESET}"
                 safe_line = line.encode('ascii', 'replace').decode('ascii')
                 self.stream.write(safe_line + self.terminator)
@@ -172,12 +280,20 @@ def setup_logging():
 
     console_handler = ColoredConsoleHandler()
 
+    # Worker threads only enqueue records; one listener thread formats them
+    # and does the console/file writes, so stdout is not a contention point
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)  # drains the queue before logging's own shutdown flush
+
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.INFO)
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
     logging.info("Logging system initialized")
 
@@ -198,11 +314,195 @@ def create_directory(dir_name):
         sys.exit(1)
 
 
+def read_umask():
+    """Current umask. /proc reads it without changing it; elsewhere os.umask has to set
+    and restore it, so this must run before any other thread can create files."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Read before setup_logging() starts the log listener thread
+FILE_MODE = 0o666 & ~read_umask()  # what a plain open() would have created
+
 setup_logging()
 
 app = Flask(__name__)
 VIDEOS_FILE = "videos.json"
+DOWNLOADED_LOG = "videos.downloaded.log"  # append-only journal of downloaded videoNames
+NEW_VIDEOS_LOG = "videos.new.ndjson"      # append-only journal of videos added since the last full save
 DOWNLOADS_DIR = "midjourney-download"
+CDN_HOST = "cdn.midjourney.com"
+MAX_WORKERS = 4              # concurrent downloads per batch
+DOWNLOAD_INTERVAL = 15       # seconds between downloads per host, per worker slot
+COPY_BUFFER_SIZE = 1024 * 1024  # bytes per read/write when streaming a response to disk
+SERVER_THREADS = 8           # waitress worker threads
+MAX_SUBSCRIBERS = SERVER_THREADS - 4  # /progress streams each hold a thread; keep some for the API
+COMPACT_EVERY = 10           # fold the downloaded journal into videos.json every N successes
+DNS_TTL = 300                # seconds a resolved CDN address is reused by the curl binary
+
+# Serializes read-modify-write cycles on videos.json (POST handler + workers)
+db_lock = Lock()
+
+
+# ---------------------------
+# Rate limiting
+# ---------------------------
+
+MAX_BACKOFF = 300            # cap for per-host backoff after 429/5xx, seconds
+
+
+def header_seconds(value):
+    """Parse a Retry-After style value (delta seconds or HTTP date) into seconds from now."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class HostRateLimiter:
+    """Token-bucket pacing per host, adapted to what the server reports.
+
+    Up to `workers` downloads may start at once, refilled at one every interval/workers
+    seconds. 429/5xx responses push the host back (Retry-After, else exponential backoff)
+    and empty its bucket; a healthy X-RateLimit-Remaining lifts the pacing entirely."""
+
+    def __init__(self, interval=DOWNLOAD_INTERVAL, workers=MAX_WORKERS):
+        self.spacing = interval / max(1, workers)
+        self.burst = max(1, workers)
+        self.next_slot = {}  # per host: when the bucket would be full again (GCRA)
+        self.host_spacing = {}
+        self.backoff = {}
+        self.lock = Lock()
+
+    def acquire(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            spacing = self.host_spacing.get(host, self.spacing)
+            if spacing == 0:
+                # Healthy host: no pacing, and no debt carried over from the old spacing
+                self.next_slot[host] = now
+                return
+            full_at = self.next_slot.get(host, now)
+            slot = max(now, full_at - spacing * (self.burst - 1))
+            self.next_slot[host] = max(full_at, slot) + spacing
+        wait = slot - now
+        if wait > 0:
+            logger.info("WAITING: %s%.1fs pause  ·  %s%s", C.DIM, wait, host, C.RESET)
+            time.sleep(wait)
+
+    def observe(self, url, status, headers):
+        """Feed a response status + headers back into the pacing for its host."""
+        host = urlparse(url).netloc
+        delay = None
+        with self.lock:
+            if status == 429 or status >= 500:
+                backoff = min(MAX_BACKOFF, self.backoff.get(host, self.spacing) * 2)
+                self.backoff[host] = backoff
+                retry_after = header_seconds(headers.get('Retry-After'))
+                delay = retry_after if retry_after is not None else backoff
+                self.host_spacing.pop(host, None)
+            elif status < 400:
+                self.backoff.pop(host, None)
+                remaining = headers.get('X-RateLimit-Remaining', '')
+                if remaining.isdigit() and int(remaining) == 0:
+                    self.host_spacing.pop(host, None)  # quota spent, pace again after the reset
+                    delay = header_seconds(headers.get('X-RateLimit-Reset-After'))
+                    reset = headers.get('X-RateLimit-Reset')
+                    if delay is None and reset:
+                        try:
+                            delay = max(0.0, float(reset) - time.time())
+                        except ValueError:
+                            pass
+                elif remaining.isdigit() and int(remaining) > 10:
+                    self.host_spacing[host] = 0
+                else:
+                    self.host_spacing.pop(host, None)
+            if delay:
+                # Never trust a server-supplied wait beyond MAX_BACKOFF; acquire() sleeps on a cdn_gate slot
+                delay = min(MAX_BACKOFF, delay)
+                # Resume after `delay` with an empty bucket, i.e. one start per spacing
+                now = time.monotonic()
+                empty_until = now + delay + self.spacing * (self.burst - 1)
+                self.next_slot[host] = max(self.next_slot.get(host, now), empty_until)
+        if delay:
+            logger.info("BACKOFF: %s next download in %.1fs", host, delay)
+
+
+rate_limiter = HostRateLimiter()
+
+
+class ConcurrencyGate:
+    """Caps how many downloads hit the CDN at once and shrinks the cap when they start failing.
+
+    Permits are "parked" (kept instead of released) to shrink the effective limit, so
+    nobody ever blocks waiting to take one away from a running worker."""
+
+    def __init__(self, limit=MAX_WORKERS, window=20, shrink_above=0.25, grow_below=0.05):
+        self.limit = limit
+        self.permits = limit
+        self.parked = 0
+        self.sem = threading.BoundedSemaphore(limit)
+        self.outcomes = deque(maxlen=window)
+        self.shrink_above = shrink_above
+        self.grow_below = grow_below
+        self.lock = Lock()
+
+    def __enter__(self):
+        self.sem.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        with self.lock:
+            if self.parked < self.limit - self.permits:
+                self.parked += 1
+                return False
+        self.sem.release()
+        return False
+
+    def record(self, ok):
+        with self.lock:
+            self.outcomes.append(ok)
+            if len(self.outcomes) < self.outcomes.maxlen or self.permits == 1:
+                return
+            fail_rate = self.outcomes.count(False) / len(self.outcomes)
+            if fail_rate > self.shrink_above:
+                self.permits = max(1, self.permits - 2)
+                self.outcomes.clear()
+                logger.info("GATE: %.0f%% failing, limiting to %d concurrent downloads", fail_rate * 100, self.permits)
+
+    def end_batch(self, success, fail):
+        """Give parked permits back after a clean batch."""
+        total = success + fail
+        with self.lock:
+            if not self.parked or not total or fail / total >= self.grow_below:
+                released = 0
+            else:
+                released = self.parked
+                self.parked = 0
+                self.permits = self.limit
+        for _ in range(released):
+            self.sem.release()
+        logger.info("GATE: %d/%d concurrent download slots", self.permits, self.limit)
+
+
+cdn_gate = ConcurrencyGate()
 
 
 # ---------------------------
@@ -217,64 +517,254 @@ USER_AGENTS = [
 ]
 
 
+# Round-robin UA rotation; cheaper than random.choice on shared global state
+_ua_iter = itertools.cycle(USER_AGENTS)
+_ua_lock = Lock()
+
+
+def next_user_agent():
+    with _ua_lock:
+        return next(_ua_iter)
+
+
+# Static part of the download headers, built once at import
+_BASE_HEADERS = MappingProxyType({
+    'Accept': 'video/mp4,video/*,*/*',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'identity',  # MP4 is already compressed
+    'DNT': '1',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Cache-Control': 'max-age=0',
+    'Referer': 'https://discord.com/',
+})
+
+
 def get_download_headers():
-    return {
-        'User-Agent': random.choice(USER_AGENTS),
-        'Accept': 'video/mp4,video/*,*/*',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Sec-Fetch-Dest': 'document',
-        'Sec-Fetch-Mode': 'navigate',
-        'Sec-Fetch-Site': 'none',
-        'Cache-Control': 'max-age=0',
-        'Referer': 'https://discord.com/',
-        'Range': 'bytes=0-'
-    }
+    """Per-request headers; the static ones already live on SESSION."""
+    return {'User-Agent': next_user_agent()}
+
+
+# Shared session: keep-alive connections are pooled and reused across
+# attempts and files instead of paying a TCP+TLS handshake every GET.
+# pool_maxsize must stay >= MAX_WORKERS
+SESSION = requests.Session()
+SESSION.headers.update(_BASE_HEADERS)
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=0)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+# The CDN gets quick transparent retries for connection failures only; status
+# codes (429/5xx) are left to download_with_requests and the rate limiter
+_cdn_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, connect=2, read=0, status=0, other=0, backoff_factor=2, raise_on_status=False),
+)
+SESSION.mount(f"https://{CDN_HOST}", _cdn_adapter)
+atexit.register(SESSION.close)
+
+# SESSION and the libcurl handles keep their own connections and DNS caches; this one
+# is for the curl binary, which otherwise resolves the host again in every process
+_dns_cache = {}
+_dns_lock = Lock()
+
+
+def cached_addresses(host, port=443):
+    """All addresses for host, looked up at most once per DNS_TTL. Empty if it does not resolve.
+
+    Every address is kept so curl can still fail over between CDN edges."""
+    now = time.monotonic()
+    with _dns_lock:
+        entry = _dns_cache.get(host)
+        if entry and entry[0] > now:
+            return entry[1]
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError:
+        return ()
+    addresses = tuple(dict.fromkeys(info[4][0] for info in infos))
+    if addresses:
+        with _dns_lock:
+            _dns_cache[host] = (now + DNS_TTL, addresses)
+    return addresses
+
+
+def forget_addresses(host):
+    """Drop a cached lookup, e.g. after its addresses stopped accepting connections."""
+    with _dns_lock:
+        _dns_cache.pop(host, None)
 
 
 # ---------------------------
 # JSON DB helpers
 # ---------------------------
 
+# The runtime DB is written compact; pass indent=True for human-facing exports
+if orjson is not None:
+    _loads = orjson.loads
+
+    def _dumps(obj, indent=False):
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+else:
+    _loads = json.loads
+
+    def _dumps(obj, indent=False):
+        if indent:
+            return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# Last parsed videos.json as ((st_mtime_ns, st_size), videos, names); polling
+# /status and per-batch reloads skip the JSON parse while the file is unchanged.
+# names is the set of videoNames, built lazily for the POST dedup path
+_videos_cache = {"entry": (None, [], None)}
+
+
+def file_key(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
 def load_videos():
-    if os.path.exists(VIDEOS_FILE):
-        with open(VIDEOS_FILE, "r", encoding="utf-8") as f:
+    key = file_key(VIDEOS_FILE)
+    cached_key, cached, _ = _videos_cache["entry"]
+    if key is None:
+        videos = []
+    elif key == cached_key:
+        videos = list(cached)
+    else:
+        with open(VIDEOS_FILE, "rb") as f:
+            raw = f.read()
+        try:
+            # orjson.JSONDecodeError subclasses json.JSONDecodeError
+            videos = _loads(raw).get("videos", [])
+        except json.JSONDecodeError:
+            videos = []
+        _videos_cache["entry"] = (key, videos, None)
+        videos = list(videos)
+
+    # Fold in videos and downloads recorded since the last full save;
+    # new videos first, since a download mark may refer to one of them.
+    # A crash between save_videos' replace and its unlink leaves journal entries
+    # that are already in videos.json, so replay skips names it has seen.
+    new_videos = load_new_videos_log()
+    journal = load_downloaded_log()
+    by_name = None
+    if new_videos:
+        by_name = {v.get('videoName'): v for v in videos}
+        for v in new_videos:
+            name = v.get('videoName')
+            if name not in by_name:
+                by_name[name] = v
+                videos.append(v)
+    if journal:
+        if by_name is None:
+            by_name = {v.get('videoName'): v for v in videos}
+        for name in journal:
+            if not mark_as_downloaded(by_name, name):
+                logging.info(f"WARNING: Could not find {name} in videos.json")
+    return videos
+
+
+def video_names():
+    """All known videoNames (videos.json + new-videos journal), built once per file version.
+
+    save_new_videos extends the set in place as it appends to the journal."""
+    key, _, names = _videos_cache["entry"]
+    if names is None or key != file_key(VIDEOS_FILE):
+        names = {v.get("videoName") for v in load_videos() if v.get("videoName")}
+        key, cached, _ = _videos_cache["entry"]
+        _videos_cache["entry"] = (key, cached, names)
+    return names
+
+
+def save_videos(videos, names=None):
+    """Rewrite the whole DB. Callers pass a list from load_videos(), so both journals are already folded in.
+
+    `names`, when given, is kept as the cached videoName set for the new file."""
+    data = _dumps({"videos": videos})
+    # One encode, one write to a temp file, then swap it in atomically so a
+    # crash mid-write never leaves a truncated DB for load_videos to discard
+    tmp = VIDEOS_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, VIDEOS_FILE)
+    _videos_cache["entry"] = (file_key(VIDEOS_FILE), list(videos), names)
+    Path(NEW_VIDEOS_LOG).unlink(missing_ok=True)
+    Path(DOWNLOADED_LOG).unlink(missing_ok=True)
+
+
+def load_downloaded_log():
+    if not os.path.exists(DOWNLOADED_LOG):
+        return []
+    with open(DOWNLOADED_LOG, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def load_new_videos_log():
+    if not os.path.exists(NEW_VIDEOS_LOG):
+        return []
+    videos = []
+    with open(NEW_VIDEOS_LOG, "rb") as f:
+        for line in f:
             try:
-                data = json.load(f)
-                return data.get("videos", [])
+                videos.append(_loads(line))
             except json.JSONDecodeError:
-                return []
-    return []
+                continue  # torn last line after a crash
+    return videos
 
 
-def save_videos(videos):
-    with open(VIDEOS_FILE, "w", encoding="utf-8") as f:
-        json.dump({"videos": videos}, f, indent=2, ensure_ascii=False)
+def append_new_videos(videos):
+    """Record newly queued videos in O(new) instead of rewriting videos.json."""
+    if payload := b"".join(_dumps(v) + b"\n" for v in videos):
+        with open(NEW_VIDEOS_LOG, "ab") as f:
+            f.write(payload)
 
 
-def save_new_videos(new_videos):
-    existing = load_videos()
-    existing_names = {v.get("videoName") for v in existing if v.get("videoName")}
-
-    unique_incoming = {}
-    for v in new_videos:
-        name = v.get("videoName")
-        if not name:
-            logging.info(f"WARNING: Skipping video with missing videoName: {v}")
-            continue
-        if name not in unique_incoming:
-            v.setdefault("downloaded", False)
-            unique_incoming[name] = v
-
-    to_add = [v for name, v in unique_incoming.items() if name not in existing_names]
-    if not to_add:
-        logging.info("NO_NEW: No new videos to add")
-        return 0
+def append_downloaded(video_name):
+    """Record one finished download in O(1) instead of rewriting videos.json."""
+    with open(DOWNLOADED_LOG, "a", encoding="utf-8") as f:
+        f.write(video_name + "\n")
+
+
+def compact_videos():
+    """Merge both journals into videos.json."""
+    with db_lock:
+        if os.path.exists(DOWNLOADED_LOG) or os.path.exists(NEW_VIDEOS_LOG):
+            # Compaction does not change which videos exist, so the name set carries over
+            save_videos(load_videos(), names=_videos_cache["entry"][2])
 
-    save_videos(existing + to_add)
+
+def save_new_videos(new_videos):
+    with db_lock:
+        existing_names = video_names()
+
+        # Single pass: dedupe within the payload and against the DB at once
+        incoming = {}
+        for v in new_videos:
+            name = v.get("videoName")
+            if not name:
+                logging.info(f"WARNING: Skipping video with missing videoName: {v}")
+                continue
+            if name not in existing_names and name not in incoming:
+                v.setdefault("downloaded", False)
+                incoming[name] = v
+
+        to_add = list(incoming.values())
+        if not to_add:
+            logging.info("NO_NEW: No new videos to add")
+            return 0
+
+        append_new_videos(to_add)
+        existing_names.update(v["videoName"] for v in to_add)
     logging.info(f"SAVED: Added {len(to_add)} new videos to database")
     return len(to_add)
 
@@ -283,130 +773,376 @@ def save_new_videos(new_videos):
 # Download helpers (no global verification)
 # ---------------------------
 
-def verify_temp_file_is_ok(temp_path, min_size_bytes=8192):
+def verify_temp_file_is_ok(temp_path, min_size_bytes=8192, size=None, expected_size=None):
+    """Check the downloaded temp file and return its size, or 0 if it is unusable.
+
+    Pass `size` when it is already known to skip the stat."""
     try:
-        size = os.path.getsize(temp_path)
+        if size is None:
+            size = os.path.getsize(temp_path)
         if size <= min_size_bytes:
-            logging.info(f"FILE_SMALL: temp file too small ({size} bytes)")
-            return False
-        return True
+            logger.info("FILE_SMALL: temp file too small (%d bytes)", size)
+            return 0
+        if expected_size is not None and size != expected_size:
+            logger.info("FILE_SIZE_MISMATCH: got %d bytes, expected %d", size, expected_size)
+            return 0
+        return size
     except FileNotFoundError:
-        return False
+        return 0
+
+
+class CountingWriter:
+    """File wrapper that counts bytes as they are written, so size is known when the stream ends."""
+
+    def __init__(self, f):
+        self.f = f
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return self.f.write(data)
+
+
+def hint_sequential_write(f, expected_size):
+    """Preallocate and mark the file as sequentially written (POSIX only, best effort)."""
+    fd = f.fileno()
+    try:
+        if expected_size and hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(fd, 0, expected_size)
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    except OSError:
+        pass
+
+
+def stream_to_file(r, temp_path, offset=0):
+    """Copy a streamed response body to temp_path, resuming at `offset` on a 206.
+
+    Returns (file_size, expected_size or None)."""
+    if r.status_code != 206:
+        offset = 0  # server ignored the Range header and sent the whole body
+
+    # Content-Length only matches the body on disk when nothing was decoded
+    expected = None
+    length = r.headers.get('Content-Length')
+    if length and length.isdigit() and not r.headers.get('Content-Encoding'):
+        expected = offset + int(length)
+
+    r.raw.decode_content = True
+    with open(temp_path, 'r+b' if offset else 'wb') as f:
+        f.seek(offset)
+        hint_sequential_write(f, expected)
+        writer = CountingWriter(f)
+        # read1 hands over whatever has arrived; read(amt) would discard a partly
+        # filled chunk when the connection drops, losing it for the resume.
+        # urllib3 1.x has no read1, so there a drop can still cost up to one buffer.
+        read = getattr(r.raw, "read1", r.raw.read)
+        try:
+            while chunk := read(COPY_BUFFER_SIZE):
+                writer.write(chunk)
+        finally:
+            # Drop preallocated space past what actually arrived, so a retry resumes at the right byte
+            f.truncate()
+    return offset + writer.size, expected
+
+
+def make_temp_path(final_path):
+    """Create a unique temp file next to final_path so workers and retries never collide."""
+    dir_ = os.path.dirname(final_path)
+    base = os.path.basename(final_path)
+    fd, temp_path = tempfile.mkstemp(dir=dir_, prefix=f".{base}.", suffix=".part")
+    os.close(fd)
+    # mkstemp creates 0600 and os.replace keeps it; downloads get the usual umask mode
+    os.chmod(temp_path, FILE_MODE)
+    return temp_path
 
 
 def atomic_move(src, dst):
-    # Ensure target dir exists
-    os.makedirs(os.path.dirname(dst), exist_ok=True)
-    # Atomic replace on same filesystem
+    # Atomic replace on same filesystem; the downloads dir is created once per run
     os.replace(src, dst)
 
 
+ALT_SUFFIX = '/0.mp4'  # CDN sometimes serves the same video at <id>.mp4
+
+
 def download_with_requests(url, final_path, max_retries=2):
-    """Download to a temp file first, verify, then atomically move."""
+    """Download to a temp file first, verify, then atomically move. Returns the size, 0 on failure."""
     headers = get_download_headers()
 
     # temp file next to final path
-    dir_ = os.path.dirname(final_path)
-    base = os.path.basename(final_path)
-    temp_path = os.path.join(dir_, f".{base}.part")
+    temp_path = make_temp_path(final_path)
+    alt_url = url[:-len(ALT_SUFFIX)] + '.mp4' if url.endswith(ALT_SUFFIX) else None
 
     for attempt in range(1, max_retries + 1):
+        retry_after = None
         try:
-            logging.info(f"REQUESTS: Attempt {attempt}/{max_retries} -> {url}")
-            with requests.get(url, headers=headers, stream=True, timeout=90) as r:
-                # If cdn sometimes wants /0.mp4 vs .mp4, try swap on first attempt failure only
-                if r.status_code == 403 and attempt == 1 and url.endswith('/0.mp4'):
-                    alt_url = url.replace('/0.mp4', '.mp4')
-                    logging.info(f"REQUESTS: 403, trying alt url {alt_url}")
-                    with requests.get(alt_url, headers=headers, stream=True, timeout=90) as r2:
-                        r2.raise_for_status()
-                        with open(temp_path, 'wb') as f:
-                            for chunk in r2.iter_content(chunk_size=8192):
-                                if chunk:
-                                    f.write(chunk)
-                else:
-                    r.raise_for_status()
-                    with open(temp_path, 'wb') as f:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
-
-            if verify_temp_file_is_ok(temp_path):
+            # Resume from whatever a previous attempt left behind
+            try:
+                resume_from = os.path.getsize(temp_path)
+            except FileNotFoundError:
+                resume_from = 0
+            attempt_headers = headers
+            if resume_from:
+                attempt_headers = {**headers, 'Range': f'bytes={resume_from}-'}
+                logger.info("REQUESTS: Attempt %d/%d -> %s (resuming at %d bytes)", attempt, max_retries, url, resume_from)
+            else:
+                logger.info("REQUESTS: Attempt %d/%d -> %s", attempt, max_retries, url)
+
+            r = SESSION.get(url, headers=attempt_headers, stream=True, timeout=90)
+            # If cdn sometimes wants /0.mp4 vs .mp4, try swap on first attempt failure only
+            if r.status_code == 403 and attempt == 1 and alt_url:
+                r.close()
+                logger.info("REQUESTS: 403, trying alt url %s", alt_url)
+                r = SESSION.get(alt_url, headers=attempt_headers, stream=True, timeout=90)
+            with r:
+                rate_limiter.observe(url, r.status_code, r.headers)
+                if r.status_code in (429, 503):
+                    retry_after = header_seconds(r.headers.get('Retry-After'))
+                    retry_after = 5 if retry_after is None else min(MAX_BACKOFF, retry_after)
+                r.raise_for_status()
+                size, expected = stream_to_file(r, temp_path, resume_from)
+
+            verified = verify_temp_file_is_ok(temp_path, size=size, expected_size=expected)
+            if verified:
                 atomic_move(temp_path, final_path)
-                logging.info(f"SUCCESS: Downloaded with requests -> {os.path.basename(final_path)}")
-                return True
+                logger.info("SUCCESS: Downloaded with requests -> %s", os.path.basename(final_path))
+                return verified
             else:
-                # cleanup and retry
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+                # cleanup and retry from scratch, the bytes on disk are not trustworthy
+                Path(temp_path).unlink(missing_ok=True)
                 time.sleep(random.uniform(3, 8))
         except Exception as e:
-            logging.info(f"ERROR: requests attempt {attempt} failed: {e}")
-            if os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except Exception:
-                    pass
+            logger.info("ERROR: requests attempt %d failed: %s", attempt, e)
+            # Keep the partial file so the next attempt can resume it
             if attempt < max_retries:
-                time.sleep(random.uniform(3, 8))
+                # Throttled: wait as long as the server asked, otherwise a short jitter
+                time.sleep(retry_after if retry_after is not None else random.uniform(3, 8))
 
-    return False
+    Path(temp_path).unlink(missing_ok=True)
+    return 0
 
 
-def download_with_curl(url, final_path):
-    """Use curl to temp file then atomically move."""
+ARIA2C = shutil.which("aria2c")
+
+try:
+    import pycurl
+except ImportError:  # optional; without it the curl binary is used
+    pycurl = None
+
+
+def run_streamed(cmd, capture_stdout=False, tail_lines=20):
+    """Run a downloader, reading stderr line by line and keeping only the last few lines.
+
+    Only capture stdout for tools that print a few bytes there (curl --write-out)."""
+    stdout_target = subprocess.PIPE if capture_stdout else subprocess.DEVNULL
+    proc = subprocess.Popen(cmd, stdout=stdout_target, stderr=subprocess.PIPE, text=True)
+    tail = deque(maxlen=tail_lines)
+    for line in proc.stderr:
+        tail.append(line.rstrip())
+    stdout = proc.stdout.read() if capture_stdout else ""
+    proc.wait()
+    return proc.returncode, stdout, "\n".join(tail)
+
+
+def download_with_aria2c(url, final_path):
+    """Use aria2c with several byte-range connections per file, then atomically move."""
+    temp_path = make_temp_path(final_path)
+    try:
+        aria_cmd = [
+            ARIA2C,
+            '-x', '4', '-s', '4', '-k', '1M',
+            '--file-allocation=none',
+            '--allow-overwrite=true',
+            '--auto-file-renaming=false',
+            '--console-log-level=warn',
+            '--summary-interval=0',
+            '--user-agent', next_user_agent(),
+            '--referer', 'https://discord.com/',
+            '--header', 'Accept: video/mp4,video/*,*/*',
+            '--connect-timeout', '30',
+            '--timeout', '300',
+            '-d', os.path.dirname(temp_path),
+            '-o', os.path.basename(temp_path),
+            url
+        ]
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("ARIA2C: %s <url>", ' '.join(aria_cmd[:-1]))
+        rc, _, err = run_streamed(aria_cmd)
+        verified = verify_temp_file_is_ok(temp_path) if rc == 0 else 0
+        if verified:
+            atomic_move(temp_path, final_path)
+            logger.info("SUCCESS: Downloaded with aria2c -> %s", os.path.basename(final_path))
+            return verified
+        if rc != 0:
+            logger.info("ERROR: aria2c failed rc=%d: %s", rc, err)
+    except Exception as e:
+        logger.info("ERROR: aria2c exception: %s", e)
+
+    for leftover in (temp_path, temp_path + ".aria2"):
+        Path(leftover).unlink(missing_ok=True)
+    return 0
+
+
+def parse_curl_output(stdout):
+    """Split curl stdout (--dump-header - then --write-out size) into (status, headers, size).
+
+    With -L there is one header block per hop; the last one belongs to the body on disk."""
+    head, _, tail = stdout.rpartition("\n")
+    size = int(tail) if tail.strip().isdigit() else None
+    status, headers = None, CaseInsensitiveDict()
+    blocks = [b for b in head.replace("\r\n", "\n").split("\n\n") if b.startswith("HTTP/")]
+    if blocks:
+        lines = blocks[-1].split("\n")
+        parts = lines[0].split()
+        if len(parts) > 1 and parts[1].isdigit():
+            status = int(parts[1])
+        for line in lines[1:]:
+            key, sep, value = line.partition(":")
+            if sep:
+                headers[key.strip()] = value.strip()
+    return status, headers, size
+
+
+_curl_local = threading.local()
+
+
+def get_curl_handle():
+    """One libcurl handle per worker thread, reused so DNS, connections and TLS sessions carry over."""
+    handle = getattr(_curl_local, "handle", None)
+    if handle is None:
+        handle = pycurl.Curl()
+        _curl_local.handle = handle
+    return handle
+
+
+def download_with_pycurl(url, final_path):
+    """In-process libcurl download to temp file, then atomically move. No fork per video."""
+    temp_path = make_temp_path(final_path)
+    headers = CaseInsensitiveDict()
+
+    def on_header(line):
+        line = line.decode("iso-8859-1").strip()
+        if line.startswith("HTTP/"):
+            headers.clear()  # a new response after a redirect
+            return
+        key, sep, value = line.partition(":")
+        if sep:
+            headers[key.strip()] = value.strip()
+
     try:
-        import subprocess
-        dir_ = os.path.dirname(final_path)
-        base = os.path.basename(final_path)
-        temp_path = os.path.join(dir_, f".{base}.part")
+        c = get_curl_handle()
+        # reset() clears options but keeps the connection pool and caches
+        c.reset()
+        with open(temp_path, 'wb') as f:
+            writer = CountingWriter(f)
+            c.setopt(pycurl.URL, url)
+            c.setopt(pycurl.FOLLOWLOCATION, 1)
+            c.setopt(pycurl.USERAGENT, next_user_agent())
+            c.setopt(pycurl.REFERER, 'https://discord.com/')
+            c.setopt(pycurl.HTTPHEADER, ['Accept: video/mp4,video/*,*/*'])
+            c.setopt(pycurl.CONNECTTIMEOUT, 30)
+            c.setopt(pycurl.TIMEOUT, 300)
+            c.setopt(pycurl.TCP_KEEPALIVE, 1)
+            c.setopt(pycurl.DNS_CACHE_TIMEOUT, DNS_TTL)  # the handle's cache survives reset()
+            c.setopt(pycurl.WRITEFUNCTION, writer.write)
+            c.setopt(pycurl.HEADERFUNCTION, on_header)
+            c.perform()
+        status = c.getinfo(pycurl.RESPONSE_CODE)
+
+        rate_limiter.observe(url, status, headers)
+        verified = verify_temp_file_is_ok(temp_path, size=writer.size) if status < 400 else 0
+        if verified:
+            atomic_move(temp_path, final_path)
+            logger.info("SUCCESS: Downloaded with libcurl -> %s", os.path.basename(final_path))
+            return verified
+        if status >= 400:
+            logger.info("ERROR: libcurl got HTTP %d", status)
+        return 0
+    except (pycurl.error, OSError) as e:
+        logger.info("ERROR: libcurl failed: %s", e)
+        return 0
+    finally:
+        # No-op after a successful move; otherwise never leave the .part behind
+        Path(temp_path).unlink(missing_ok=True)
 
+
+def download_with_curl(url, final_path):
+    """Use curl to temp file then atomically move.
+
+    Tries aria2c first when installed, then in-process libcurl (pycurl), then the curl binary."""
+    if ARIA2C:
+        verified = download_with_aria2c(url, final_path)
+        if verified:
+            return verified
+    if pycurl is not None:
+        return download_with_pycurl(url, final_path)
+    temp_path = make_temp_path(final_path)
+    try:
         curl_cmd = [
-            'curl', '-L',
-            '--user-agent', random.choice(USER_AGENTS),
+            'curl', '-L', '-sS',
+            '--user-agent', next_user_agent(),
             '--referer', 'https://discord.com/',
             '--header', 'Accept: video/mp4,video/*,*/*',
             '--connect-timeout', '30',
             '--max-time', '300',
             '--retry', '2',
             '--retry-delay', '5',
+            '--dump-header', '-',
+            '--write-out', '%{size_download}',
             '-o', temp_path,
             url
         ]
-
-        logging.info(f"CURL: {' '.join(curl_cmd[:-1])} <url>")
-        result = subprocess.run(curl_cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            logging.info(f"ERROR: curl failed rc={result.returncode}: {result.stderr}")
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            return False
-
-        if verify_temp_file_is_ok(temp_path):
+        parsed = urlparse(url)
+        pinned = parsed.hostname == CDN_HOST and parsed.scheme == 'https'
+        addresses = cached_addresses(CDN_HOST) if pinned else ()
+        if addresses:
+            # Comma-separated list (curl >= 7.59); IPv6 literals go in brackets
+            listed = ','.join(f"[{a}]" if ':' in a else a for a in addresses)
+            curl_cmd[1:1] = ['--resolve', f"{CDN_HOST}:{parsed.port or 443}:{listed}"]
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("CURL: %s <url>", ' '.join(curl_cmd[:-1]))
+        rc, stdout, err = run_streamed(curl_cmd, capture_stdout=True)
+        status, headers, size = parse_curl_output(stdout)
+        if status is not None:
+            rate_limiter.observe(url, status, headers)
+        if rc == 0 and status is not None and status >= 400:
+            rc, err = 22, f"HTTP {status}"  # same exit code curl --fail would use
+        if rc != 0:
+            logger.info("ERROR: curl failed rc=%d: %s", rc, err)
+            if addresses and rc in (7, 28):
+                forget_addresses(CDN_HOST)  # couldn't connect / timed out: resolve afresh next time
+            return 0
+
+        verified = verify_temp_file_is_ok(temp_path, size=size)
+        if verified:
             atomic_move(temp_path, final_path)
-            logging.info(f"SUCCESS: Downloaded with curl -> {os.path.basename(final_path)}")
-            return True
-        else:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            return False
+            logger.info("SUCCESS: Downloaded with curl -> %s", os.path.basename(final_path))
+            return verified
+        return 0
 
     except Exception as e:
-        logging.info(f"ERROR: curl exception: {e}")
-        return False
+        logger.info("ERROR: curl exception: %s", e)
+        return 0
+    finally:
+        # No-op after a successful move; otherwise never leave the .part behind
+        Path(temp_path).unlink(missing_ok=True)
 
 
 def download_video_with_retry(url, final_path, prefer_curl=True):
-    """Try curl first (optional), then requests. No global folder/JSON comparisons."""
+    """Try curl first (optional), then requests. Returns the downloaded size, 0 on failure."""
     if prefer_curl:
-        if download_with_curl(url, final_path):
-            return True
-        logging.info("FALLBACK: curl failed, trying requests...")
+        size = download_with_curl(url, final_path)
+        if size:
+            return size
+        logger.info("FALLBACK: curl failed, trying requests...")
         return download_with_requests(url, final_path)
     else:
-        if download_with_requests(url, final_path):
-            return True
-        logging.info("FALLBACK: requests failed, trying curl...")
+        size = download_with_requests(url, final_path)
+        if size:
+            return size
+        logger.info("FALLBACK: requests failed, trying curl...")
         return download_with_curl(url, final_path)
 
 
@@ -414,12 +1150,13 @@ def download_video_with_retry(url, final_path, prefer_curl=True):
 # Core flow: per-item verify & mark
 # ---------------------------
 
-def mark_as_downloaded(videos, video_name):
-    for v in videos:
-        if v.get('videoName') == video_name:
-            v['downloaded'] = True
-            return True
-    return False
+def mark_as_downloaded(by_name, video_name):
+    """Mark a video in a {videoName: video} index; O(1) lookup."""
+    v = by_name.get(video_name)
+    if v is None:
+        return False
+    v['downloaded'] = True
+    return True
 
 
 def format_size(size_bytes):
@@ -434,17 +1171,20 @@ def format_size(size_bytes):
         return f"{size_bytes / (1024 ** 3):.2f} GB"
 
 
-def log_box(lines, style="single", color=C.WHITE):
-    """Log a box with unicode box-drawing characters."""
+def log_box(lines, style="single", color=C.WHITE, flush=False):
+    """Log a box with unicode box-drawing characters.
+
+    flush=True also writes out the buffered log file, for end-of-batch summaries."""
     if style == "double":
         tl, tr, bl, br, h, v = "╔", "╗", "╚", "╝", "═", "║"
     else:
         tl, tr, bl, br, h, v = "┌", "┐", "└", "┘", "─", "│"
     width = max(len(line) for line in lines) + 2
-    logging.info(f"{color}{tl}{h * width}{tr}{C.RESET}")
-    for line in lines:
-        logging.info(f"{color}{v}{C.RESET} {color}{line.ljust(width - 1)}{C.RESET}{color}{v}{C.RESET}")
-    logging.info(f"{color}{bl}{h * width}{br}{C.RESET}")
+    # One record (so one console write) for the whole box
+    box = [f"{color}{tl}{h * width}{tr}{C.RESET}"]
+    box.extend(f"{color}{v}{C.RESET} {color}{line.ljust(width - 1)}{C.RESET}{color}{v}{C.RESET}" for line in lines)
+    box.append(f"{color}{bl}{h * width}{br}{C.RESET}")
+    logging.info("\n".join(box), extra={"flush": flush})
 
 
 def log_progress_bar(current, total, width=20):
@@ -455,6 +1195,22 @@ def log_progress_bar(current, total, width=20):
     return f"[{bar}] {pct}%"
 
 
+def download_one(task, idx, total):
+    """Worker: take a CDN slot and a rate-limit slot, then download a single video."""
+    url, name, filename, final_path = task
+
+    with cdn_gate:
+        rate_limiter.acquire(url)
+        logger.info("DOWNLOADING: %s[%d/%d]%s%s %s%s", C.BOLD, idx, total, C.RESET, C.CYAN, filename, C.RESET)
+        logger.info("URL: %s", url)
+
+        # Size comes from the verifier, no second stat after the move
+        file_size = download_video_with_retry(url, final_path, prefer_curl=True)
+    ok = file_size > 0
+    cdn_gate.record(ok)
+    return name, filename, ok, file_size
+
+
 def download_pending_videos_background():
     """Background function that loops through batches until no pending videos remain."""
     total_success = 0
@@ -490,45 +1246,45 @@ def download_pending_videos_background():
             batch_fail = 0
             batch_bytes = 0
 
-            for idx, video in enumerate(pending, start=1):
-                url = video['videoUrl']
-                name = video['videoName']
-                filename = f"{name}.mp4"
-                final_path = os.path.join(downloads_path, filename)
-
-                progress = log_progress_bar(idx - 1, len(pending))
-                logging.info(f"DOWNLOADING: {C.BOLD}[{idx}/{len(pending)}]{C.RESET}{C.CYAN} {filename}{C.RESET}  {C.DIM}{progress}{C.RESET}")
-                logging.info(f"URL: {url}")
-
-                ok = download_video_with_retry(url, final_path, prefer_curl=True)
-                if ok:
-                    # Track file size
-                    file_size_str = ""
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+                # Resolve names and paths up front; workers get ready-made tuples
+                tasks = [
+                    (v['videoUrl'], v['videoName'], f"{v['videoName']}.mp4",
+                     os.path.join(downloads_path, f"{v['videoName']}.mp4"))
+                    for v in pending
+                ]
+                futures = {
+                    pool.submit(download_one, task, idx, len(tasks)): task
+                    for idx, task in enumerate(tasks, start=1)
+                }
+                for done, future in enumerate(as_completed(futures), start=1):
                     try:
-                        file_size = os.path.getsize(final_path)
+                        name, filename, ok, file_size = future.result()
+                    except Exception as e:
+                        # One broken item must not abort the batch and lose the successes so far
+                        _, name, filename, _ = futures[future]
+                        ok, file_size = False, 0
+                        cdn_gate.record(False)
+                        logger.error("WORKER_ERROR: %s: %s", filename, e)
+                    progress = log_progress_bar(done, len(pending))
+                    if ok:
                         batch_bytes += file_size
-                        file_size_str = format_size(file_size)
-                    except OSError:
-                        pass
-
-                    # Reload videos to ensure we have latest state
-                    videos = load_videos()
-                    if mark_as_downloaded(videos, name):
-                        save_videos(videos)
+                        file_size_str = format_size(file_size) if file_size else ""
+
+                        with db_lock:
+                            append_downloaded(name)
                         download_manager.update_progress()
+                        batch_success += 1
+                        if batch_success % COMPACT_EVERY == 0:
+                            compact_videos()
+                        logger.info("  %s%sCOMPLETED%s %s%s  ·  %s%s  %s%s%s", C.GREEN, C.BOLD, C.RESET, C.GREEN, filename, file_size_str, C.RESET, C.DIM, progress, C.RESET)
                     else:
-                        logging.info(f"WARNING: Could not find {name} in videos.json")
-                    batch_success += 1
-                    logging.info(f"  {C.GREEN}{C.BOLD}COMPLETED{C.RESET} {C.GREEN}{filename}  ·  {file_size_str}{C.RESET}")
-                else:
-                    batch_fail += 1
-                    logging.info(f"  {C.RED}{C.BOLD}FAILED{C.RESET} {C.RED}{filename}{C.RESET}")
+                        batch_fail += 1
+                        logger.info("  %s%sFAILED%s %s%s%s  %s%s%s", C.RED, C.BOLD, C.RESET, C.RED, filename, C.RESET, C.DIM, progress, C.RESET)
 
-                # pacing
-                remaining = len(pending) - idx
-                if remaining > 0:
-                    logging.info(f"WAITING: {C.DIM}15s pause  ·  {remaining} remaining{C.RESET}")
-                    time.sleep(15)
+            # Fold this batch's journal into videos.json once
+            compact_videos()
+            cdn_gate.end_batch(batch_success, batch_fail)
 
             # Batch summary
             logging.info("")
@@ -536,7 +1292,7 @@ def download_pending_videos_background():
             fail_str = f"{C.RED}{batch_fail} failed{C.RESET}" if batch_fail else f"{C.DIM}0 failed{C.RESET}"
             log_box([
                 f"BATCH {batch_num} DONE  ·  {ok_str}{C.CYAN}  ·  {fail_str}{C.CYAN}  ·  {format_size(batch_bytes)}",
-            ], style="single", color=C.CYAN)
+            ], style="single", color=C.CYAN, flush=True)
 
             total_success += batch_success
             total_fail += batch_fail
@@ -550,6 +1306,10 @@ def download_pending_videos_background():
     except Exception as e:
         logging.error(f"BACKGROUND_ERROR: {e}")
     finally:
+        try:
+            compact_videos()
+        except Exception as e:
+            logging.error(f"COMPACT_ERROR: {e}")
         elapsed = (datetime.now() - download_manager.start_time).total_seconds() if download_manager.start_time else 0
         batches_done = download_manager.batch_number
         download_manager.finish_download()
@@ -568,7 +1328,7 @@ def download_pending_videos_background():
             f"  Failed     : {fail_color}{total_fail}{C.RESET}{C.MAGENTA}",
             f"  Total size : {C.BOLD}{format_size(total_bytes)}{C.RESET}{C.MAGENTA}",
             f"  Duration   : {mins}m {secs}s",
-        ], style="double", color=C.MAGENTA)
+        ], style="double", color=C.MAGENTA, flush=True)
 
 
 # ---------------------------
@@ -602,17 +1362,22 @@ def dailyvids():
     pending_count = len([v for v in all_videos if not v.get('downloaded', False)])
 
     if pending_count > 0:
-        logging.info(f"STARTING: {C.CYAN}Launching download thread  ·  {pending_count} pending{C.RESET}")
-        thread = threading.Thread(target=download_pending_videos_background, daemon=True)
-        thread.start()
-        download_manager.download_thread = thread
+        if not download_manager.launch(download_pending_videos_background):
+            # Another POST scheduled a run between our status check and now
+            return {
+                "message": f"Download already starting. Queued {added_count} new videos for next batch.",
+                "status": "busy",
+                "new_videos_queued": added_count,
+                "download_progress": download_manager.get_status()
+            }, 202
+        logging.info(f"STARTING: {C.CYAN}Queued download run  ·  {pending_count} pending{C.RESET}")
 
         return {
             "message": f"Saved {added_count} new videos. Download started for {pending_count} pending videos.",
             "status": "started",
             "new_videos": added_count,
             "pending_videos": pending_count
-        }, 200
+        }, 202  # 202 Accepted - downloads continue in the background
     else:
         logging.info("NO_DOWNLOAD: No pending videos to download.")
         return {
@@ -641,6 +1406,48 @@ def get_status():
     }, 200
 
 
+@app.route("/export", methods=["GET"])
+def export():
+    """Pretty-printed copy of the video DB, for humans"""
+    body = _dumps({"videos": load_videos()}, indent=True)
+    return Response(body, mimetype="application/json",
+                    headers={"Content-Disposition": "attachment; filename=videos.json"})
+
+
+@app.route("/progress", methods=["GET"])
+def progress():
+    """Server-Sent Events stream of download status, pushed on every change.
+
+    The stream ends once downloads are idle, so it does not hold a server thread forever."""
+    q = download_manager.subscribe(MAX_SUBSCRIBERS)
+    if q is None:
+        return {"message": "Too many /progress listeners", "status": "unavailable"}, 503, {"Retry-After": "30"}
+
+    def stream():
+        try:
+            # Ask EventSource clients to wait before reconnecting after an idle close
+            yield "retry: 30000\n\n"
+            status = download_manager.get_status()
+            yield f"data: {json.dumps(status)}\n\n"
+            while status["status"] == "downloading":
+                try:
+                    status = q.get(timeout=30)
+                except queue.Empty:
+                    if download_manager.is_downloading:
+                        yield ": heartbeat\n\n"
+                        continue
+                    status = download_manager.get_status()  # missed the final event
+                yield f"data: {json.dumps(status)}\n\n"
+        finally:
+            download_manager.unsubscribe(q)
+
+    response = Response(stream_with_context(stream()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache"})
+    # Also release the slot if the client goes away before the generator ever runs
+    response.call_on_close(lambda: download_manager.unsubscribe(q))
+    return response
+
+
 if __name__ == "__main__":
     logging.info("")
     log_box([
@@ -648,6 +1455,14 @@ if __name__ == "__main__":
         f"Server : http://localhost:5000",
         f"POST   : /dailyvids",
         f"GET    : /status",
+        f"GET    : /progress (SSE)",
+        f"GET    : /export",
     ], style="double", color=C.BLUE)
     logging.info("")
-    app.run(debug=True, port=5000, threaded=True)  # threaded=True to handle concurrent requests
\ No newline at end of file
+    if os.environ.get("FLASK_DEBUG") == "1":
+        # Local development only: reloader + debugger
+        app.run(debug=True, port=5000, threaded=True)
+    else:
+        from waitress import serve
+        # Each /progress subscriber holds a thread for as long as it listens
+        serve(app, host="127.0.0.1", port=5000, threads=SERVER_THREADS)
\ No newline at end of file